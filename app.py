@@ -1,4 +1,7 @@
+import hashlib
 import logging
+import re
+import sys
 from contextlib import asynccontextmanager
 from pathlib import Path
 
@@ -6,12 +9,15 @@ import uvicorn
 from fastapi import FastAPI, Request, status
 from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, FileResponse
+from fastapi.responses import ORJSONResponse, Response
+from fastapi.staticfiles import StaticFiles
+from starlette.exceptions import HTTPException as StarletteHTTPException
+from starlette.types import Scope
 
 from config import settings
 from database import cosmos_db
 from routes_auth import router as auth_router
-from routes_media import router as media_router
+from routes_media import router as media_router, thumbnail_renderer
 from storage import blob_storage
 
 # Setup logging configuration
@@ -21,6 +27,9 @@ logging.basicConfig(
 )
 app_logger = logging.getLogger(__name__)
 
+# Angular build output carries a content hash, e.g. main.32404ddb892f3d54.js
+HASHED_ASSET_PATTERN = re.compile(r"\.[0-9a-f]{16,}\.(js|css)$")
+
 
 @asynccontextmanager
 async def application_lifespan(application: FastAPI):
@@ -28,17 +37,27 @@ async def application_lifespan(application: FastAPI):
     # Application startup phase
     app_logger.info("Initializing Cloud Media Platform API...")
     try:
-        cosmos_db.initialize()
-        blob_storage.initialize()
+        await cosmos_db.initialize()
+        await blob_storage.initialize()
+        thumbnail_renderer.initialize()
         app_logger.info("All Azure services are ready")
     except Exception as error:
         app_logger.error(f"Azure services initialization failed: {error}")
         raise
 
+    # Keep the SPA entry page in memory so navigations skip disk I/O
+    index_file = frontend_static_path / "index.html"
+    if index_file.is_file():
+        application.state.index_bytes = index_file.read_bytes()
+        application.state.index_etag = f'"{hashlib.md5(application.state.index_bytes).hexdigest()}"'
+
     yield
 
     # Application shutdown phase
     app_logger.info("Terminating Cloud Media Platform API...")
+    await cosmos_db.close()
+    await blob_storage.close()
+    thumbnail_renderer.close()
 
 
 # Initialize FastAPI application instance
@@ -47,6 +66,7 @@ app = FastAPI(
     version="1.0.0",
     description="REST API for cloud-based media storage and management",
     lifespan=application_lifespan,
+    default_response_class=ORJSONResponse,
     docs_url="/api/docs",
     openapi_url="/api/openapi.json",
     redoc_url="/api/redoc"
@@ -56,9 +76,9 @@ app = FastAPI(
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
-    allow_origins=settings.allowed_origins_list,
-    allow_headers=["*"],
-    allow_methods=["*"]
+    allow_origins=frozenset(settings.allowed_origins_list),
+    allow_headers=["Authorization", "Content-Type", "If-None-Match"],
+    allow_methods=["GET", "POST", "PUT", "DELETE", "PATCH", "OPTIONS"]
 )
 
 
@@ -66,7 +86,7 @@ app.add_middleware(
 @app.exception_handler(RequestValidationError)
 async def handle_validation_error(req: Request, validation_err: RequestValidationError):
     """Process request validation errors"""
-    return JSONResponse(
+    return ORJSONResponse(
         content={
             "error": {
                 "message": "Invalid request data",
@@ -83,7 +103,7 @@ async def handle_general_error(req: Request, error: Exception):
     """Process unexpected exceptions"""
     app_logger.error(f"Unexpected error occurred: {error}", exc_info=True)
     error_details = str(error) if settings.api_host == "0.0.0.0" else None
-    return JSONResponse(
+    return ORJSONResponse(
         content={
             "error": {
                 "message": "An unexpected error occurred",
@@ -113,30 +133,49 @@ app.include_router(media_router, prefix="/api")
 # Frontend static file serving configuration
 frontend_static_path = Path(__file__).parent / "static"
 if frontend_static_path.exists():
+    def build_index_response(req: Request) -> Response:
+        """Serve the cached index.html, answering 304 when the client copy is current"""
+        index_etag = req.app.state.index_etag
+        cache_headers = {"ETag": index_etag, "Cache-Control": "no-cache"}
+        if req.headers.get("if-none-match") == index_etag:
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=cache_headers)
+        return Response(
+            content=req.app.state.index_bytes, media_type="text/html", headers=cache_headers
+        )
+
     # Root endpoint serves main page
     @app.get("/", tags=["Frontend"])
-    async def deliver_main_page():
+    async def deliver_main_page(req: Request):
         """Deliver primary Angular application page"""
-        return FileResponse(frontend_static_path / "index.html")
-
-    # Wildcard route for SPA navigation (must be defined last)
-    @app.get("/{resource_path:path}", tags=["Frontend"])
-    async def deliver_spa_resource(resource_path: str):
-        """Handle SPA routing and static resources"""
-        # Reject requests to non-existent API endpoints
-        if resource_path.startswith("api/"):
-            return JSONResponse(
-                content={"error": {"message": "Endpoint not found", "code": "NOT_FOUND"}},
-                status_code=status.HTTP_404_NOT_FOUND
-            )
-
-        # Serve static file if it exists
-        static_file = frontend_static_path / resource_path
-        if static_file.is_file():
-            return FileResponse(static_file)
-
-        # Default to index.html for client-side routing
-        return FileResponse(frontend_static_path / "index.html")
+        return build_index_response(req)
+
+    # Unknown API paths must not fall through to the SPA
+    @app.get("/api/{resource_path:path}", tags=["Frontend"])
+    async def reject_unknown_api_path(resource_path: str):
+        """Reject requests to non-existent API endpoints"""
+        return ORJSONResponse(
+            content={"error": {"message": "Endpoint not found", "code": "NOT_FOUND"}},
+            status_code=status.HTTP_404_NOT_FOUND
+        )
+
+    class FrontendStaticFiles(StaticFiles):
+        """Serve build assets, falling back to index.html for client-side routes"""
+
+        async def get_response(self, path: str, scope: Scope) -> Response:
+            try:
+                response = await super().get_response(path, scope)
+            except StarletteHTTPException as static_error:
+                if static_error.status_code != status.HTTP_404_NOT_FOUND:
+                    raise
+                return build_index_response(Request(scope))
+
+            # Content-hashed bundle names never change contents
+            if HASHED_ASSET_PATTERN.search(path):
+                response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+            return response
+
+    # Static assets and SPA navigation (must be registered last)
+    app.mount("/", FrontendStaticFiles(directory=frontend_static_path), name="frontend")
 else:
     # Default endpoint when static files are not available
     @app.get("/", tags=["Root"])
@@ -152,8 +191,13 @@ else:
 if __name__ == "__main__":
     uvicorn.run(
         "app:app",
-        reload=True,
+        reload=settings.debug,
+        # Reload mode runs a single process, so workers only apply outside debug
+        workers=None if settings.debug else settings.api_workers,
         host=settings.api_host,
+        # uvloop has no Windows build; fall back to asyncio there
+        loop="asyncio" if sys.platform == "win32" else "uvloop",
+        http="httptools",
         log_level="info",
         port=settings.api_port
     )
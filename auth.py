@@ -1,26 +1,31 @@
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from typing import Optional
+import threading
+import time
+import bcrypt
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from config import settings
 
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
 # HTTP Bearer token
 security = HTTPBearer()
 
+# Recently verified tokens -> (user_id, exp), so repeat requests skip jwt.decode
+TOKEN_CACHE_MAX_ENTRIES = 10_000
+_token_cache: "OrderedDict[str, tuple[str, int]]" = OrderedDict()
+_token_cache_lock = threading.Lock()
+
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password against its hash"""
-    return pwd_context.verify(plain_password, hashed_password)
+    return bcrypt.checkpw(plain_password.encode("utf-8"), hashed_password.encode("utf-8"))
 
 
 def get_password_hash(password: str) -> str:
     """Hash a password"""
-    return pwd_context.hash(password)
+    return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
 
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
@@ -54,6 +59,29 @@ def decode_access_token(token: str) -> dict:
         )
 
 
+def _get_cached_user_id(token: str) -> Optional[str]:
+    """Return the user ID for a previously verified, unexpired token"""
+    with _token_cache_lock:
+        cached_entry = _token_cache.get(token)
+        if cached_entry is None:
+            return None
+        user_id, expires_at = cached_entry
+        if expires_at <= time.time():
+            del _token_cache[token]
+            return None
+        _token_cache.move_to_end(token)
+        return user_id
+
+
+def _cache_user_id(token: str, user_id: str, expires_at: int) -> None:
+    """Remember a verified token, evicting the least recently used entry when full"""
+    with _token_cache_lock:
+        _token_cache[token] = (user_id, expires_at)
+        _token_cache.move_to_end(token)
+        if len(_token_cache) > TOKEN_CACHE_MAX_ENTRIES:
+            _token_cache.popitem(last=False)
+
+
 async def get_current_user_id(
     credentials: HTTPAuthorizationCredentials = Depends(security),
 ) -> str:
@@ -61,6 +89,10 @@ async def get_current_user_id(
     Dependency to get the current authenticated user ID from JWT token
     """
     token = credentials.credentials
+    cached_user_id = _get_cached_user_id(token)
+    if cached_user_id is not None:
+        return cached_user_id
+
     payload = decode_access_token(token)
     user_id: str = payload.get("sub")
     if user_id is None:
@@ -69,4 +101,8 @@ async def get_current_user_id(
             detail="Could not validate credentials",
             headers={"WWW-Authenticate": "Bearer"},
         )
+
+    expires_at = payload.get("exp")
+    if expires_at is not None:
+        _cache_user_id(token, user_id, expires_at)
     return user_id
@@ -1,12 +1,19 @@
-from pydantic_settings import BaseSettings
+from pydantic_settings import BaseSettings, SettingsConfigDict
 from typing import List
 
 
 class Settings(BaseSettings):
+    model_config = SettingsConfigDict(env_file=".env", case_sensitive=False)
+
     # Azure Cosmos DB Configuration
     cosmos_endpoint: str
     cosmos_key: str
     cosmos_database_name: str = "CloudMediaDB"
+    cosmos_preferred_locations: str = ""
+    cosmos_request_timeout_seconds: int = 5
+    # Fall back to a cross-partition email query for accounts missing from users-by-email;
+    # turn off once `fix_users.py --backfill-emails` has indexed every existing account
+    legacy_email_lookup: bool = True
 
     # Azure Blob Storage Configuration
     azure_storage_connection_string: str
@@ -20,21 +27,23 @@ class Settings(BaseSettings):
     # API Configuration
     api_host: str = "0.0.0.0"
     api_port: int = 8000
+    api_workers: int = 1
     allowed_origins: str = "http://localhost:4200"
+    debug: bool = False
 
     # File Upload Configuration
     max_file_size_mb: int = 100
     allowed_image_types: str = "image/jpeg,image/png,image/gif,image/webp"
     allowed_video_types: str = "video/mp4,video/mpeg,video/quicktime,video/webm"
 
-    class Config:
-        env_file = ".env"
-        case_sensitive = False
-
     @property
     def allowed_origins_list(self) -> List[str]:
         return [origin.strip() for origin in self.allowed_origins.split(",")]
 
+    @property
+    def cosmos_preferred_locations_list(self) -> List[str]:
+        return [loc.strip() for loc in self.cosmos_preferred_locations.split(",") if loc.strip()]
+
     @property
     def allowed_image_types_list(self) -> List[str]:
         return [t.strip() for t in self.allowed_image_types.split(",")]
@@ -1,168 +1,500 @@
-from azure.cosmos import CosmosClient, exceptions, PartitionKey
-from azure.cosmos.container import ContainerProxy
+from azure.core import MatchConditions
+from azure.core.pipeline.transport import AioHttpTransport
+from azure.cosmos import exceptions, PartitionKey
+from azure.cosmos.aio import CosmosClient
+from cachetools import TTLCache
 from typing import Optional, List, Dict, Any
 from config import settings
+import aiohttp
+import asyncio
+import hashlib
 import logging
+import time
 
 db_logger = logging.getLogger(__name__)
 
+# Shared HTTPS pool for all Cosmos requests made by this worker
+COSMOS_POOL_LIMIT = 200
+COSMOS_POOL_LIMIT_PER_HOST = 100
+COSMOS_KEEPALIVE_SECONDS = 60
+
+# An email claim with no user document after this long belongs to a failed registration
+STALE_EMAIL_CLAIM_SECONDS = 60
+
+# Item totals are cached so list/search calls skip the COUNT scan on every page
+COUNT_CACHE_TTL_SECONDS = 60
+COUNT_CACHE_MAX_ENTRIES = 10_000
+
+# User records rarely change, so point reads are served from memory for a while
+USER_CACHE_TTL_SECONDS = 60
+USER_CACHE_MAX_ENTRIES = 10_000
+
+# Hot media records are re-read on detail views, edits and deletes
+MEDIA_CACHE_TTL_SECONDS = 30
+MEDIA_CACHE_MAX_ENTRIES = 10_000
+
+# Media query text is fixed per filter shape; only parameters vary between calls.
+# Equality-filtered properties lead each ORDER BY (they are constant within a result
+# set) so Cosmos serves the sort from a composite index in MEDIA_INDEXING_POLICY
+_USER_MEDIA_SQL = (
+    "SELECT * FROM media m WHERE m.userId = @userId"
+    " ORDER BY m.userId ASC, m.uploadedAt DESC"
+)
+_USER_MEDIA_COUNT_SQL = "SELECT VALUE COUNT(1) FROM media m WHERE m.userId = @userId"
+_USER_MEDIA_TYPED_SQL = (
+    "SELECT * FROM media m WHERE m.userId = @userId AND m.mediaType = @mediaType"
+    " ORDER BY m.userId ASC, m.mediaType ASC, m.uploadedAt DESC"
+)
+_USER_MEDIA_TYPED_COUNT_SQL = (
+    "SELECT VALUE COUNT(1) FROM media m WHERE m.userId = @userId AND m.mediaType = @mediaType"
+)
+_SEARCH_MEDIA_FILTER = (
+    "FROM media m WHERE m.userId = @userId AND ("
+    "CONTAINS(m.originalFileName_lc, @searchTerm)"
+    " OR CONTAINS(m.description_lc, @searchTerm)"
+    " OR ARRAY_CONTAINS(m.tags_lc, @searchTerm))"
+)
+_SEARCH_MEDIA_SQL = f"SELECT * {_SEARCH_MEDIA_FILTER} ORDER BY m.userId ASC, m.uploadedAt DESC"
+_SEARCH_MEDIA_COUNT_SQL = f"SELECT VALUE COUNT(1) {_SEARCH_MEDIA_FILTER}"
+
+# Media listing sorts by upload time within a user's partition
+MEDIA_INDEXING_POLICY = {
+    "indexingMode": "consistent",
+    "includedPaths": [{"path": "/*"}],
+    "excludedPaths": [{"path": '/"_etag"/?'}],
+    "compositeIndexes": [
+        [
+            {"path": "/userId", "order": "ascending"},
+            {"path": "/uploadedAt", "order": "descending"}
+        ],
+        [
+            {"path": "/userId", "order": "ascending"},
+            {"path": "/mediaType", "order": "ascending"},
+            {"path": "/uploadedAt", "order": "descending"}
+        ]
+    ]
+}
+
+# Single-property ordering used while the composite indexes are still being built;
+# Cosmos rejects multi-property ORDER BY without a matching composite index
+_UPLOAD_ORDER_FALLBACK_SQL = {
+    sql: sql[:sql.index(" ORDER BY")] + " ORDER BY m.uploadedAt DESC"
+    for sql in (_USER_MEDIA_SQL, _USER_MEDIA_TYPED_SQL, _SEARCH_MEDIA_SQL)
+}
+
+# Returned on container reads with quota info while an indexing policy change is applied
+INDEX_TRANSFORMATION_PROGRESS_HEADER = "x-ms-documentdb-collection-index-transformation-progress"
+
+
+class InvalidCursorError(ValueError):
+    """Raised when Cosmos rejects a client-supplied continuation token"""
+
 
 class CosmosDBClient:
     def __init__(self):
-        self.client = CosmosClient(settings.cosmos_endpoint, settings.cosmos_key)
+        self.client = None
+        self.http_session = None
         self.database = None
         self.users_container = None
+        self.users_by_email_container = None
         self.media_container = None
+        self.composite_indexes_ready = False
+        self._count_cache = TTLCache(maxsize=COUNT_CACHE_MAX_ENTRIES, ttl=COUNT_CACHE_TTL_SECONDS)
+        self._user_cache = TTLCache(maxsize=USER_CACHE_MAX_ENTRIES, ttl=USER_CACHE_TTL_SECONDS)
+        self._pending_user_reads: Dict[str, asyncio.Future] = {}
+        self._media_cache = TTLCache(maxsize=MEDIA_CACHE_MAX_ENTRIES, ttl=MEDIA_CACHE_TTL_SECONDS)
 
-    def initialize(self):
+    async def initialize(self):
         """Setup database and container resources"""
         try:
+            # Build the client inside the running loop so its pool belongs to this worker
+            self.http_session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=COSMOS_POOL_LIMIT,
+                    limit_per_host=COSMOS_POOL_LIMIT_PER_HOST,
+                    keepalive_timeout=COSMOS_KEEPALIVE_SECONDS
+                )
+            )
+            self.client = CosmosClient(
+                settings.cosmos_endpoint,
+                settings.cosmos_key,
+                connection_timeout=settings.cosmos_request_timeout_seconds,
+                preferred_locations=settings.cosmos_preferred_locations_list,
+                transport=AioHttpTransport(session=self.http_session, session_owner=False)
+            )
+
             # Setup database instance
-            self.database = self.client.create_database_if_not_exists(
+            self.database = await self.client.create_database_if_not_exists(
                 id=settings.cosmos_database_name
             )
             db_logger.info(f"Database '{settings.cosmos_database_name}' initialized")
 
             # Setup users storage container
-            self.users_container = self.database.create_container_if_not_exists(
+            self.users_container = await self.database.create_container_if_not_exists(
                 partition_key=PartitionKey(path="/id"),
                 id="users",
                 offer_throughput=400
             )
             db_logger.info("Users container initialized")
 
+            # Setup email -> user ID lookup container
+            self.users_by_email_container = await self.database.create_container_if_not_exists(
+                partition_key=PartitionKey(path="/email"),
+                id="users-by-email",
+                offer_throughput=400
+            )
+            db_logger.info("Users-by-email container initialized")
+
             # Setup media storage container
-            self.media_container = self.database.create_container_if_not_exists(
+            self.media_container = await self.database.create_container_if_not_exists(
                 partition_key=PartitionKey(path="/userId"),
                 id="media",
+                indexing_policy=MEDIA_INDEXING_POLICY,
                 offer_throughput=400
             )
+            await self._ensure_media_indexes()
             db_logger.info("Media container initialized")
 
         except exceptions.CosmosHttpResponseError as cosmos_error:
             db_logger.error(f"Cosmos DB initialization failed: {cosmos_error}")
             raise
 
+    async def _ensure_media_indexes(self) -> None:
+        """Apply MEDIA_INDEXING_POLICY to a media container created before it existed"""
+        response_headers = {}
+        container_properties = await self.media_container.read(
+            populate_quota_info=True,
+            response_hook=lambda headers, _: response_headers.update(
+                (name.lower(), value) for name, value in headers.items()
+            )
+        )
+
+        current_policy = container_properties.get("indexingPolicy", {})
+        if not _composite_index_keys(MEDIA_INDEXING_POLICY) <= _composite_index_keys(current_policy):
+            db_logger.info("Adding composite indexes to the media container")
+            self.media_container = await self.database.replace_container(
+                self.media_container,
+                partition_key=PartitionKey(path="/userId"),
+                indexing_policy=MEDIA_INDEXING_POLICY
+            )
+            self.composite_indexes_ready = False
+        else:
+            progress = response_headers.get(INDEX_TRANSFORMATION_PROGRESS_HEADER)
+            self.composite_indexes_ready = progress is None or int(progress) >= 100
+
+        if not self.composite_indexes_ready:
+            db_logger.info("Media composite indexes are building; sorting by upload time only")
+
+    async def close(self):
+        """Release the client's HTTP connection pool"""
+        if self.client is not None:
+            await self.client.close()
+        if self.http_session is not None:
+            await self.http_session.close()
+
     # Account management operations
-    def create_user(self, account_data: dict) -> dict:
-        """Insert new user account"""
+    async def create_user(self, account_data: dict) -> dict:
+        """Insert new user account, claiming its email first so duplicates fail fast"""
+        email_mapping = _email_index_record(account_data)
         try:
-            return self.users_container.create_item(body=account_data)
+            await self.users_by_email_container.create_item(body=email_mapping)
         except exceptions.CosmosResourceExistsError:
-            raise ValueError("User already exists")
+            await self._reclaim_stale_email(email_mapping)
         except exceptions.CosmosHttpResponseError as cosmos_err:
             db_logger.error(f"User creation failed: {cosmos_err}")
             raise
 
-    def get_user_by_email(self, email_address: str) -> Optional[dict]:
+        # Any failure from here on must release the claim, or the address stays locked
+        claim_held = True
+        try:
+            # Accounts registered before the email index existed have no claim to collide with
+            legacy_account = None
+            if settings.legacy_email_lookup:
+                legacy_account = await self._find_unindexed_user(account_data["email"])
+            if legacy_account is not None:
+                await self.index_user_email(legacy_account)
+                claim_held = False
+                raise ValueError("User with this email already exists")
+
+            saved_account = await self.users_container.create_item(body=account_data)
+        except BaseException as creation_error:
+            if claim_held:
+                await self._release_email_claim(email_mapping)
+            if isinstance(creation_error, exceptions.CosmosResourceExistsError):
+                raise ValueError("User already exists")
+            if isinstance(creation_error, exceptions.CosmosHttpResponseError):
+                db_logger.error(f"User creation failed: {creation_error}")
+            raise
+
+        self._user_cache.pop(saved_account["id"], None)
+        return saved_account
+
+    async def _reclaim_stale_email(self, email_mapping: dict) -> None:
+        """Take over an email claim left behind by a failed registration, else reject"""
+        try:
+            existing_claim = await self.users_by_email_container.read_item(
+                partition_key=email_mapping["email"], item=email_mapping["id"]
+            )
+        except exceptions.CosmosResourceNotFoundError:
+            # Released between the create and this read; treat as taken and let the user retry
+            raise ValueError("User with this email already exists")
+
+        # A claim younger than the grace period may belong to a registration still in flight
+        claim_age = time.time() - existing_claim.get("_ts", 0)
+        if (
+            claim_age < STALE_EMAIL_CLAIM_SECONDS
+            or await self.get_user_by_id(existing_claim["userId"]) is not None
+        ):
+            raise ValueError("User with this email already exists")
+
+        db_logger.warning(f"Replacing stale email claim for user {existing_claim['userId']}")
+        try:
+            # Conditional on the read so concurrent registrations cannot both take it over
+            await self.users_by_email_container.replace_item(
+                item=email_mapping["id"],
+                body=email_mapping,
+                etag=existing_claim["_etag"],
+                match_condition=MatchConditions.IfNotModified
+            )
+        except exceptions.CosmosAccessConditionFailedError:
+            raise ValueError("User with this email already exists")
+
+    async def _release_email_claim(self, email_mapping: dict) -> None:
+        """Delete an email claim after its registration failed"""
+        try:
+            await self.users_by_email_container.delete_item(
+                partition_key=email_mapping["email"], item=email_mapping["id"]
+            )
+        except Exception as release_error:
+            db_logger.error(
+                f"Failed to release email claim for user {email_mapping['userId']}: {release_error}"
+            )
+
+    async def index_user_email(self, account: dict) -> None:
+        """Record the email -> user ID mapping used for login lookups"""
+        await self.users_by_email_container.upsert_item(body=_email_index_record(account))
+
+    async def get_user_by_email(self, email_address: str) -> Optional[dict]:
         """Fetch user by email address"""
         try:
-            sql_query = "SELECT * FROM users u WHERE u.email = @email"
-            query_params = [{"name": "@email", "value": email_address}]
-            results = list(
-                self.users_container.query_items(
-                    enable_cross_partition_query=True, query=sql_query, parameters=query_params
-                )
+            mapping = await self.users_by_email_container.read_item(
+                partition_key=email_address, item=_email_index_id(email_address)
             )
-            return results[0] if results else None
+        except exceptions.CosmosResourceNotFoundError:
+            # Not indexed yet: accounts created before the email index get indexed on
+            # their first login, after which they take the point-read path above
+            if not settings.legacy_email_lookup:
+                return None
+            legacy_account = await self._find_unindexed_user(email_address)
+            if legacy_account is not None:
+                await self.index_user_email(legacy_account)
+            return legacy_account
+        except exceptions.CosmosHttpResponseError as cosmos_err:
+            db_logger.error(f"Email lookup failed: {cosmos_err}")
+            raise
+        return await self.get_user_by_id(mapping["userId"])
+
+    async def _find_unindexed_user(self, email_address: str) -> Optional[dict]:
+        """Look a user up by email with a cross-partition query (pre-index accounts)"""
+        try:
+            matches = [
+                account async for account in self.users_container.query_items(
+                    query="SELECT * FROM users u WHERE u.email = @email",
+                    parameters=[{"name": "@email", "value": email_address}],
+                    max_item_count=1
+                )
+            ]
         except exceptions.CosmosHttpResponseError as cosmos_err:
             db_logger.error(f"Email lookup failed: {cosmos_err}")
             raise
+        return matches[0] if matches else None
 
-    def get_user_by_id(self, account_id: str) -> Optional[dict]:
+    async def get_user_by_id(self, account_id: str) -> Optional[dict]:
         """Fetch user by unique identifier"""
+        cached_account = self._user_cache.get(account_id)
+        if cached_account is not None:
+            return cached_account
+
+        # Concurrent lookups for the same account share a single point read
+        pending_read = self._pending_user_reads.get(account_id)
+        if pending_read is None:
+            pending_read = asyncio.ensure_future(self._read_user(account_id))
+            self._pending_user_reads[account_id] = pending_read
+            pending_read.add_done_callback(
+                lambda _: self._pending_user_reads.pop(account_id, None)
+            )
+        return await asyncio.shield(pending_read)
+
+    async def _read_user(self, account_id: str) -> Optional[dict]:
+        """Point-read a user and populate the cache"""
         try:
-            return self.users_container.read_item(partition_key=account_id, item=account_id)
+            account = await self.users_container.read_item(partition_key=account_id, item=account_id)
         except exceptions.CosmosResourceNotFoundError:
             return None
         except exceptions.CosmosHttpResponseError as cosmos_err:
             db_logger.error(f"User ID lookup failed: {cosmos_err}")
             raise
 
+        self._user_cache[account_id] = account
+        return account
+
+    # Media count caching helpers
+    async def _count_media(
+        self, owner_id: str, cache_key: tuple, count_sql: str, params: list
+    ) -> int:
+        """Return cached media count, querying Cosmos only on a miss"""
+        total = self._count_cache.get(cache_key)
+        if total is None:
+            total = 0
+            async for count in self.media_container.query_items(
+                parameters=params, query=count_sql, partition_key=owner_id
+            ):
+                total = count
+                break
+            self._count_cache[cache_key] = total
+        return total
+
+    async def _query_media_page(
+        self,
+        sql_query: str,
+        params: list,
+        owner_id: str,
+        page: int,
+        page_size: int,
+        continuation: Optional[str]
+    ) -> tuple[List[dict], Optional[str]]:
+        """Fetch one page of media and the continuation token for the next one"""
+        if not self.composite_indexes_ready:
+            sql_query = _UPLOAD_ORDER_FALLBACK_SQL[sql_query]
+
+        if continuation is None and page > 1:
+            # Page-number access without a token still has to skip via OFFSET
+            skip_count = (page - 1) * page_size
+            records = [
+                record async for record in self.media_container.query_items(
+                    parameters=params,
+                    query=f"{sql_query} OFFSET {skip_count} LIMIT {page_size}",
+                    partition_key=owner_id,
+                    max_item_count=page_size
+                )
+            ]
+            return records, None
+
+        pager = self.media_container.query_items(
+            query=sql_query,
+            parameters=params,
+            partition_key=owner_id,
+            max_item_count=page_size
+        ).by_page(continuation)
+        try:
+            current_page = await pager.__anext__()
+            records = [record async for record in current_page]
+        except StopAsyncIteration:
+            records = []
+        except exceptions.CosmosHttpResponseError as cosmos_err:
+            # Cursors come from the client; a malformed, stale or mismatched one is a 400
+            if continuation is not None and cosmos_err.status_code == 400:
+                raise InvalidCursorError("Invalid cursor")
+            raise
+        return records, pager.continuation_token
+
+    def _invalidate_media_counts(self, owner_id: str) -> None:
+        """Drop cached counts for a user after their media changes"""
+        for cache_key in [key for key in self._count_cache if key[0] == owner_id]:
+            self._count_cache.pop(cache_key, None)
+
     # Media file operations
-    def create_media(self, media_record: dict) -> dict:
+    async def create_media(self, media_record: dict) -> dict:
         """Insert new media record"""
         try:
-            return self.media_container.create_item(body=media_record)
+            created_record = await self.media_container.create_item(
+                body=with_search_fields(media_record)
+            )
+            self._invalidate_media_counts(media_record["userId"])
+            return created_record
         except exceptions.CosmosHttpResponseError as cosmos_err:
             db_logger.error(f"Media creation failed: {cosmos_err}")
             raise
 
-    def get_media_by_id(self, record_id: str, owner_id: str) -> Optional[dict]:
+    async def get_media_by_id(self, record_id: str, owner_id: str) -> Optional[dict]:
         """Retrieve media by unique identifier"""
+        cached_record = self._media_cache.get((record_id, owner_id))
+        if cached_record is not None:
+            return cached_record
+
         try:
-            return self.media_container.read_item(partition_key=owner_id, item=record_id)
+            media_record = await self.media_container.read_item(
+                partition_key=owner_id, item=record_id
+            )
         except exceptions.CosmosResourceNotFoundError:
             return None
         except exceptions.CosmosHttpResponseError as cosmos_err:
             db_logger.error(f"Media ID lookup failed: {cosmos_err}")
             raise
 
-    def get_user_media(
+        self._media_cache[(record_id, owner_id)] = media_record
+        return media_record
+
+    async def get_user_media(
         self,
         user_id: str,
         page: int = 1,
         page_size: int = 20,
-        media_type: Optional[str] = None
-    ) -> tuple[List[dict], int]:
+        media_type: Optional[str] = None,
+        continuation: Optional[str] = None
+    ) -> tuple[List[dict], int, Optional[str]]:
         """Retrieve paginated user media collection"""
         try:
-            # Construct SQL query
-            base_query = "SELECT * FROM media m WHERE m.userId = @userId"
+            # Select SQL for the filter shape
             params = [{"name": "@userId", "value": user_id}]
-
             if media_type:
-                base_query += " AND m.mediaType = @mediaType"
+                base_query, count_sql = _USER_MEDIA_TYPED_SQL, _USER_MEDIA_TYPED_COUNT_SQL
                 params.append({"name": "@mediaType", "value": media_type})
+            else:
+                base_query, count_sql = _USER_MEDIA_SQL, _USER_MEDIA_COUNT_SQL
 
-            base_query += " ORDER BY m.uploadedAt DESC"
-
-            # Calculate total records
-            count_sql = base_query.replace("SELECT *", "SELECT VALUE COUNT(1)")
-            count_results = list(
-                self.media_container.query_items(
-                    parameters=params, query=count_sql
-                )
+            # Calculate total records (cached)
+            total_records = await self._count_media(
+                user_id, (user_id, "list", media_type), count_sql, params
             )
-            total_records = count_results[0] if count_results else 0
 
-            # Implement pagination
-            skip_count = (page - 1) * page_size
-            paginated_query = f"{base_query} OFFSET {skip_count} LIMIT {page_size}"
-
-            records = list(
-                self.media_container.query_items(parameters=params, query=paginated_query)
+            # Fetch requested page
+            records, next_token = await self._query_media_page(
+                base_query, params, user_id, page, page_size, continuation
             )
 
-            return records, total_records
+            return records, total_records, next_token
 
         except exceptions.CosmosHttpResponseError as cosmos_err:
             db_logger.error(f"User media retrieval failed: {cosmos_err}")
             raise
 
-    def update_media(self, record_id: str, owner_id: str, modifications: dict) -> dict:
+    async def update_media(self, record_id: str, owner_id: str, modifications: dict) -> dict:
         """Modify media metadata"""
         try:
-            # Retrieve current record
-            current_record = self.get_media_by_id(record_id, owner_id)
-            if not current_record:
-                raise ValueError("Media not found")
-
-            # Apply modifications
-            current_record.update(modifications)
-
-            # Persist changes
-            return self.media_container.replace_item(
-                body=current_record, item=record_id
+            # Patch only the modified fields in a single round trip
+            patch_operations = [
+                {"op": "set", "path": f"/{field}", "value": value}
+                for field, value in with_search_fields(modifications).items()
+            ]
+            updated_record = await self.media_container.patch_item(
+                item=record_id, partition_key=owner_id, patch_operations=patch_operations
             )
+            self._media_cache[(record_id, owner_id)] = updated_record
+            self._invalidate_media_counts(owner_id)
+            return updated_record
+        except exceptions.CosmosResourceNotFoundError:
+            raise ValueError("Media not found")
         except exceptions.CosmosHttpResponseError as cosmos_err:
             db_logger.error(f"Media update failed: {cosmos_err}")
             raise
 
-    def delete_media(self, record_id: str, owner_id: str) -> bool:
+    async def delete_media(self, record_id: str, owner_id: str) -> bool:
         """Remove media record"""
+        self._media_cache.pop((record_id, owner_id), None)
         try:
-            self.media_container.delete_item(partition_key=owner_id, item=record_id)
+            await self.media_container.delete_item(partition_key=owner_id, item=record_id)
+            self._invalidate_media_counts(owner_id)
             return True
         except exceptions.CosmosResourceNotFoundError:
             return False
@@ -170,52 +502,79 @@ class CosmosDBClient:
             db_logger.error(f"Media deletion failed: {cosmos_err}")
             raise
 
-    def search_media(
-        self, user_id: str, query: str, page: int = 1, page_size: int = 20
-    ) -> tuple[List[dict], int]:
+    async def search_media(
+        self,
+        user_id: str,
+        query: str,
+        page: int = 1,
+        page_size: int = 20,
+        continuation: Optional[str] = None
+    ) -> tuple[List[dict], int, Optional[str]]:
         """Find media by text search"""
         try:
-            # Build search SQL
-            search_sql = """
-                SELECT * FROM media m
-                WHERE m.userId = @userId
-                AND (
-                    CONTAINS(LOWER(m.originalFileName), LOWER(@searchTerm))
-                    OR CONTAINS(LOWER(m.description), LOWER(@searchTerm))
-                    OR ARRAY_CONTAINS(m.tags, @searchTerm, true)
-                )
-                ORDER BY m.uploadedAt DESC
-            """
+            search_term = query.lower()
             params = [
                 {"name": "@userId", "value": user_id},
-                {"name": "@searchTerm", "value": query}
+                {"name": "@searchTerm", "value": search_term}
             ]
 
-            # Calculate total matches
-            count_sql = search_sql.replace("SELECT *", "SELECT VALUE COUNT(1)")
-            count_data = list(
-                self.media_container.query_items(
-                    parameters=params, query=count_sql
-                )
+            # Calculate total matches (cached)
+            total_matches = await self._count_media(
+                user_id, (user_id, "search", search_term), _SEARCH_MEDIA_COUNT_SQL, params
             )
-            total_matches = count_data[0] if count_data else 0
 
-            # Add pagination
-            skip_count = (page - 1) * page_size
-            search_sql += f" OFFSET {skip_count} LIMIT {page_size}"
-
-            matches = list(
-                self.media_container.query_items(
-                    parameters=params, query=search_sql
-                )
+            # Fetch requested page
+            matches, next_token = await self._query_media_page(
+                _SEARCH_MEDIA_SQL, params, user_id, page, page_size, continuation
             )
 
-            return matches, total_matches
+            return matches, total_matches, next_token
 
         except exceptions.CosmosHttpResponseError as cosmos_err:
             db_logger.error(f"Media search failed: {cosmos_err}")
             raise
 
 
+def with_search_fields(media_fields: dict) -> dict:
+    """Add lowercase copies of searchable fields so search queries avoid LOWER()"""
+    search_fields = dict(media_fields)
+    if "originalFileName" in media_fields:
+        search_fields["originalFileName_lc"] = media_fields["originalFileName"].lower()
+    if "description" in media_fields:
+        description = media_fields["description"]
+        search_fields["description_lc"] = description.lower() if description else None
+    if "tags" in media_fields:
+        tags = media_fields["tags"]
+        search_fields["tags_lc"] = [tag.lower() for tag in tags] if tags else None
+    return search_fields
+
+
+def _composite_index_keys(indexing_policy: dict) -> set:
+    """Composite indexes of an indexing policy as comparable (path, order) tuples"""
+    return {
+        tuple((entry["path"], entry.get("order", "ascending")) for entry in composite_index)
+        for composite_index in indexing_policy.get("compositeIndexes", [])
+    }
+
+
+def _email_index_id(email_address: str) -> str:
+    """Build a Cosmos-safe document ID for an email (IDs may not contain '/', '?' or '#')"""
+    return hashlib.sha256(email_address.encode("utf-8")).hexdigest()
+
+
+def _email_index_record(account: dict) -> dict:
+    """Build the users-by-email document pointing at an account"""
+    return {
+        "id": _email_index_id(account["email"]),
+        "email": account["email"],
+        "userId": account["id"]
+    }
+
+
 # Singleton instance
 cosmos_db = CosmosDBClient()
+
+
+async def get_cosmos() -> CosmosDBClient:
+    """Dependency providing the process-wide Cosmos DB client"""
+    return cosmos_db
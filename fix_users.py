@@ -2,9 +2,12 @@
 """
 检查和修复数据库中的用户密码哈希
 """
+import asyncio
 import sys
 import logging
-from database import cosmos_db
+from urllib.parse import unquote, urlparse
+from database import cosmos_db, with_search_fields
+from utils import to_timestamp_ms
 from auth import get_password_hash
 
 logging.basicConfig(
@@ -14,7 +17,7 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
-def check_users():
+async def check_users():
     """检查所有用户的密码哈希"""
     logger.info("=" * 60)
     logger.info("检查数据库中的用户...")
@@ -22,15 +25,13 @@ def check_users():
 
     try:
         # 初始化数据库
-        cosmos_db.initialize()
+        await cosmos_db.initialize()
 
         # 查询所有用户
         query = "SELECT * FROM users u"
-        items = list(
-            cosmos_db.users_container.query_items(
-                query=query, enable_cross_partition_query=True
-            )
-        )
+        items = [
+            item async for item in cosmos_db.users_container.query_items(query=query)
+        ]
 
         logger.info(f"\n找到 {len(items)} 个用户\n")
 
@@ -61,9 +62,11 @@ def check_users():
     except Exception as e:
         logger.error(f"检查失败: {e}", exc_info=True)
         return False
+    finally:
+        await cosmos_db.close()
 
 
-def fix_user_password(email: str, new_password: str):
+async def fix_user_password(email: str, new_password: str):
     """修复用户密码"""
     logger.info("=" * 60)
     logger.info(f"修复用户密码: {email}")
@@ -71,10 +74,10 @@ def fix_user_password(email: str, new_password: str):
 
     try:
         # 初始化数据库
-        cosmos_db.initialize()
+        await cosmos_db.initialize()
 
         # 查找用户
-        user = cosmos_db.get_user_by_email(email)
+        user = await cosmos_db.get_user_by_email(email)
         if not user:
             logger.error(f"用户不存在: {email}")
             return False
@@ -86,7 +89,7 @@ def fix_user_password(email: str, new_password: str):
 
         # 更新用户
         user["hashed_password"] = new_hash
-        cosmos_db.users_container.replace_item(item=user["id"], body=user)
+        await cosmos_db.users_container.replace_item(item=user["id"], body=user)
 
         logger.info(f"✓ 成功更新用户密码: {email}")
         return True
@@ -94,14 +97,82 @@ def fix_user_password(email: str, new_password: str):
     except Exception as e:
         logger.error(f"修复失败: {e}", exc_info=True)
         return False
+    finally:
+        await cosmos_db.close()
 
 
-def main():
+async def backfill_email_index():
+    """为已有用户补建邮箱索引"""
+    logger.info("=" * 60)
+    logger.info("补建邮箱索引...")
+    logger.info("=" * 60)
+
+    try:
+        # 初始化数据库
+        await cosmos_db.initialize()
+
+        # 查询所有用户
+        query = "SELECT * FROM users u"
+        items = [
+            item async for item in cosmos_db.users_container.query_items(query=query)
+        ]
+
+        for user in items:
+            await cosmos_db.index_user_email(user)
+            logger.info(f"  ✓ 已索引: {user.get('email', '未知')}")
+
+        logger.info(f"\n共索引 {len(items)} 个用户")
+        logger.info("所有用户均已索引，可在 .env 中设置 LEGACY_EMAIL_LOOKUP=false 关闭跨分区邮箱查询")
+        return True
+
+    except Exception as e:
+        logger.error(f"补建索引失败: {e}", exc_info=True)
+        return False
+    finally:
+        await cosmos_db.close()
+
+
+async def backfill_media_records():
+    """为已有媒体记录补建小写搜索字段、缩略图文件名，并将时间转换为毫秒时间戳"""
+    logger.info("=" * 60)
+    logger.info("升级媒体记录...")
+    logger.info("=" * 60)
+
+    try:
+        # 初始化数据库
+        await cosmos_db.initialize()
+
+        # 查询所有媒体记录
+        query = "SELECT * FROM media m"
+        items = [
+            item async for item in cosmos_db.media_container.query_items(query=query)
+        ]
+
+        for media in items:
+            media["uploadedAt"] = to_timestamp_ms(media["uploadedAt"])
+            media["updatedAt"] = to_timestamp_ms(media["updatedAt"])
+            # 旧记录未保存缩略图文件名，从缩略图 URL 路径（/容器名/文件名）中提取
+            if media.get("thumbnailUrl") and "thumbnailFileName" not in media:
+                thumb_path = unquote(urlparse(media["thumbnailUrl"]).path)
+                media["thumbnailFileName"] = thumb_path.split("/", 2)[2]
+            await cosmos_db.media_container.upsert_item(body=with_search_fields(media))
+
+        logger.info(f"\n共更新 {len(items)} 条媒体记录")
+        return True
+
+    except Exception as e:
+        logger.error(f"升级媒体记录失败: {e}", exc_info=True)
+        return False
+    finally:
+        await cosmos_db.close()
+
+
+async def main():
     """主函数"""
     logger.info("用户密码诊断工具\n")
 
     # 检查所有用户
-    success = check_users()
+    success = await check_users()
 
     if not success:
         logger.error("\n❌ 检查失败")
@@ -112,6 +183,10 @@ def main():
     logger.info("=" * 60)
     logger.info("\n如果发现问题用户，可以使用以下命令修复：")
     logger.info("python fix_users.py --fix <email> <new_password>")
+    logger.info("\n如果用户无法通过邮箱登录，可以使用以下命令补建邮箱索引：")
+    logger.info("python fix_users.py --backfill-emails")
+    logger.info("\n如果旧媒体无法被搜索到或排序异常，可以使用以下命令升级媒体记录：")
+    logger.info("python fix_users.py --backfill-media")
 
     return 0
 
@@ -123,7 +198,13 @@ if __name__ == "__main__":
             sys.exit(1)
         email = sys.argv[2]
         password = sys.argv[3]
-        success = fix_user_password(email, password)
+        success = asyncio.run(fix_user_password(email, password))
+        sys.exit(0 if success else 1)
+    elif len(sys.argv) > 1 and sys.argv[1] == "--backfill-emails":
+        success = asyncio.run(backfill_email_index())
+        sys.exit(0 if success else 1)
+    elif len(sys.argv) > 1 and sys.argv[1] == "--backfill-media":
+        success = asyncio.run(backfill_media_records())
         sys.exit(0 if success else 1)
     else:
-        sys.exit(main())
+        sys.exit(asyncio.run(main()))
@@ -1,7 +1,8 @@
 # 视觉重构：重新组织模型类结构、调整字段顺序、重命名别名
-from pydantic import BaseModel, EmailStr, Field, validator
+from pydantic import BaseModel, ConfigDict, EmailStr, Field
 from typing import Optional, List
 from datetime import datetime
+from enum import Enum
 
 
 # Account-related data models
@@ -15,16 +16,15 @@ class AccountRegistration(AccountBase):
 
 
 class AccountProfile(AccountBase):
+    model_config = ConfigDict(populate_by_name=True)
+
     id: str
     created_at: datetime = Field(alias="createdAt")
 
-    class Config:
-        populate_by_name = True
-
 
 class AccountInDatabase(AccountBase):
     hashed_password: str
-    created_at: datetime
+    created_at: int
     id: str
 
 
@@ -40,6 +40,11 @@ class CredentialsInput(BaseModel):
 
 
 # Content (Media) data models
+class MediaKind(str, Enum):
+    image = "image"
+    video = "video"
+
+
 class ContentMetadata(BaseModel):
     tags: Optional[List[str]] = None
     description: Optional[str] = Field(None, max_length=500)
@@ -54,6 +59,8 @@ class ContentModification(ContentMetadata):
 
 
 class ContentRecord(ContentMetadata):
+    model_config = ConfigDict(populate_by_name=True)
+
     user_id: str = Field(alias="userId")
     original_file_name: str = Field(alias="originalFileName")
     file_name: str = Field(alias="fileName")
@@ -66,9 +73,6 @@ class ContentRecord(ContentMetadata):
     thumbnail_url: Optional[str] = Field(None, alias="thumbnailUrl")
     updated_at: datetime = Field(alias="updatedAt")
 
-    class Config:
-        populate_by_name = True
-
 
 class ContentInDatabase(BaseModel):
     tags: Optional[List[str]] = None
@@ -82,18 +86,19 @@ class ContentInDatabase(BaseModel):
     media_type: str
     mime_type: str
     thumbnail_url: Optional[str] = None
-    uploaded_at: datetime
-    updated_at: datetime
+    thumbnail_file_name: Optional[str] = None
+    uploaded_at: int
+    updated_at: int
 
 
 class ContentCollection(BaseModel):
+    model_config = ConfigDict(populate_by_name=True)
+
     page_size: int = Field(alias="pageSize")
     items: List[ContentRecord]
     total: int
     page: int
-
-    class Config:
-        populate_by_name = True
+    next_cursor: Optional[str] = Field(None, alias="nextCursor")
 
 
 # Error response models
@@ -6,9 +6,10 @@ from auth import (
     create_access_token,
     get_current_user_id
 )
-from database import cosmos_db
-from datetime import datetime
-import uuid
+from database import CosmosDBClient, get_cosmos
+from utils import current_timestamp_ms
+import asyncio
+import secrets
 import logging
 
 auth_logger = logging.getLogger(__name__)
@@ -17,23 +18,18 @@ router = APIRouter(tags=["Authentication"], prefix="/auth")
 
 
 @router.post("/register", status_code=status.HTTP_200_OK, response_model=AuthenticationToken)
-async def create_user_account(registration_data: AccountRegistration):
+async def create_user_account(
+    registration_data: AccountRegistration,
+    cosmos_db: CosmosDBClient = Depends(get_cosmos)
+):
     """Create new user registration"""
     try:
-        # Verify email availability
         auth_logger.info(f"New registration request: {registration_data.email}")
-        user_exists = cosmos_db.get_user_by_email(registration_data.email)
-        if user_exists:
-            auth_logger.warning(f"Duplicate email detected: {registration_data.email}")
-            raise HTTPException(
-                detail="User with this email already exists",
-                status_code=status.HTTP_400_BAD_REQUEST
-            )
 
         # Build user record
-        new_user_id = str(uuid.uuid4())
-        hashed_pwd = get_password_hash(registration_data.password)
-        timestamp = datetime.utcnow().isoformat()
+        new_user_id = secrets.token_hex(16)
+        hashed_pwd = await asyncio.to_thread(get_password_hash, registration_data.password)
+        timestamp = current_timestamp_ms()
 
         user_record = {
             "id": new_user_id,
@@ -43,8 +39,8 @@ async def create_user_account(registration_data: AccountRegistration):
             "created_at": timestamp
         }
 
-        # Persist to database
-        saved_user = cosmos_db.create_user(user_record)
+        # Persist to database (rejects duplicate emails)
+        saved_user = await cosmos_db.create_user(user_record)
         auth_logger.info(f"Successfully registered: {registration_data.email}")
 
         # Create authentication token
@@ -78,12 +74,15 @@ async def create_user_account(registration_data: AccountRegistration):
 
 
 @router.post("/login", status_code=status.HTTP_200_OK, response_model=AuthenticationToken)
-async def authenticate_user(credentials: CredentialsInput):
+async def authenticate_user(
+    credentials: CredentialsInput,
+    cosmos_db: CosmosDBClient = Depends(get_cosmos)
+):
     """Authenticate and issue access token"""
     try:
         # Fetch user account
         auth_logger.info(f"Authentication request: {credentials.email}")
-        account = cosmos_db.get_user_by_email(credentials.email)
+        account = await cosmos_db.get_user_by_email(credentials.email)
         if not account:
             auth_logger.warning(f"Account not found: {credentials.email}")
             raise HTTPException(
@@ -92,7 +91,9 @@ async def authenticate_user(credentials: CredentialsInput):
             )
 
         # Validate credentials
-        password_valid = verify_password(credentials.password, account["hashed_password"])
+        password_valid = await asyncio.to_thread(
+            verify_password, credentials.password, account["hashed_password"]
+        )
         if not password_valid:
             auth_logger.warning(f"Invalid credentials for: {credentials.email}")
             raise HTTPException(
@@ -1,13 +1,26 @@
 from fastapi import APIRouter, HTTPException, status, Depends, UploadFile, File, Form, Query
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel
 from typing import Optional, List
-from models import ContentRecord, ContentModification, ContentCollection
+from models import ContentRecord, ContentModification, ContentCollection, MediaKind
 from auth import get_current_user_id
-from database import cosmos_db
-from storage import blob_storage
-from utils import validate_file_type, validate_file_size, generate_thumbnail
-from datetime import datetime
+from database import CosmosDBClient, InvalidCursorError, get_cosmos
+from storage import BlobStorageClient, get_blob_storage
+from utils import (
+    validate_file_type,
+    validate_file_size,
+    generate_thumbnail,
+    current_timestamp_ms,
+    from_timestamp_ms
+)
+from concurrent.futures import ProcessPoolExecutor
+import asyncio
+import io
+import multiprocessing
+import os
+import sys
 import uuid
-import json
+import orjson
 import logging
 
 media_logger = logging.getLogger(__name__)
@@ -15,11 +28,76 @@ media_logger = logging.getLogger(__name__)
 router = APIRouter(tags=["Media Management"], prefix="/media")
 
 
-@router.post("", status_code=status.HTTP_201_CREATED, response_model=ContentRecord)
+class ThumbnailRenderer:
+    """Runs CPU-bound thumbnailing in worker processes instead of on the event loop"""
+
+    def __init__(self):
+        self.pool = None
+
+    def initialize(self):
+        """Start the worker pool (called from the application lifespan)"""
+        # forkserver children start clean instead of forking a process with live threads;
+        # Windows only supports spawn, which is already its default
+        mp_context = None if sys.platform == "win32" else multiprocessing.get_context("forkserver")
+        self.pool = ProcessPoolExecutor(max_workers=os.cpu_count(), mp_context=mp_context)
+
+    def close(self):
+        """Stop the worker pool without waiting for queued thumbnails"""
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = None
+
+    async def render(self, image_bytes: bytes) -> Optional[bytes]:
+        """Generate a thumbnail, returning None (no preview) if the pool fails"""
+        if self.pool is None:
+            self.initialize()
+        active_pool = self.pool
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                active_pool, generate_thumbnail, image_bytes
+            )
+        except Exception as render_error:
+            media_logger.warning(f"Thumbnail generation failed: {render_error}")
+            # generate_thumbnail handles its own errors, so anything raised here means the
+            # pool itself failed (e.g. a child ran out of memory or the pool was shut down);
+            # replace it once even when several in-flight uploads observe the same failure
+            if self.pool is active_pool:
+                self.close()
+                self.initialize()
+            return None
+
+
+thumbnail_renderer = ThumbnailRenderer()
+
+
+def build_content_record(media_item: dict) -> ContentRecord:
+    """Build a ContentRecord from a stored document without re-running validation"""
+    return ContentRecord.model_construct(**{
+        **media_item,
+        "uploadedAt": from_timestamp_ms(media_item["uploadedAt"]),
+        "updatedAt": from_timestamp_ms(media_item["updatedAt"])
+    })
+
+
+def build_json_response(
+    payload: BaseModel, status_code: int = status.HTTP_200_OK
+) -> ORJSONResponse:
+    """Serialize a response model once, bypassing FastAPI's response_model pass"""
+    return ORJSONResponse(content=payload.model_dump(by_alias=True), status_code=status_code)
+
+
+@router.post(
+    "",
+    status_code=status.HTTP_201_CREATED,
+    response_class=ORJSONResponse,
+    responses={status.HTTP_201_CREATED: {"model": ContentRecord}}
+)
 async def process_file_upload(
     uploaded_file: UploadFile = File(...),
     file_description: Optional[str] = Form(None),
     file_tags: Optional[str] = Form(None),
+    cosmos_db: CosmosDBClient = Depends(get_cosmos),
+    blob_storage: BlobStorageClient = Depends(get_blob_storage),
     current_user: str = Depends(get_current_user_id)
 ):
     """Process and store uploaded media file"""
@@ -34,44 +112,60 @@ async def process_file_upload(
         parsed_tags = None
         if file_tags:
             try:
-                parsed_tags = json.loads(file_tags)
+                parsed_tags = orjson.loads(file_tags)
                 if not isinstance(parsed_tags, list):
                     raise ValueError("Tags must be an array")
-            except json.JSONDecodeError:
+            except orjson.JSONDecodeError:
                 raise HTTPException(
                     detail="Invalid tags format. Must be a JSON array.",
                     status_code=status.HTTP_400_BAD_REQUEST
                 )
 
-        # Extract file content
-        binary_content = await uploaded_file.read()
-        await uploaded_file.seek(0)
+        # Images are read once and the same buffer feeds both thumbnail and upload;
+        # videos stream from the spooled file without being read into memory
+        preview_data = None
+        upload_source = uploaded_file.file
+        if content_type == "image":
+            image_bytes = await uploaded_file.read()
+            upload_source = io.BytesIO(image_bytes)
+            preview_data = await thumbnail_renderer.render(image_bytes)
+
+        # Upload original and thumbnail concurrently
+        pending_uploads = [
+            blob_storage.upload_file(
+                upload_source,
+                current_user,
+                uploaded_file.filename,
+                uploaded_file.content_type,
+                length=size_in_bytes
+            )
+        ]
+        if preview_data:
+            pending_uploads.append(
+                blob_storage.upload_file(
+                    io.BytesIO(preview_data),
+                    current_user,
+                    f"thumb_{uploaded_file.filename}",
+                    "image/jpeg"
+                )
+            )
+        upload_results = await asyncio.gather(*pending_uploads, return_exceptions=True)
 
-        # Store file in blob storage
-        stored_name, access_url = blob_storage.upload_file(
-            uploaded_file.file, current_user, uploaded_file.filename, uploaded_file.content_type
-        )
+        if isinstance(upload_results[0], BaseException):
+            raise upload_results[0]
+        stored_name, access_url = upload_results[0]
 
-        # Create thumbnail for image files
+        thumb_name = None
         preview_url = None
-        if content_type == "image":
-            preview_data = generate_thumbnail(binary_content)
-            if preview_data:
-                try:
-                    import io
-                    preview_stream = io.BytesIO(preview_data)
-                    thumb_name, preview_url = blob_storage.upload_file(
-                        preview_stream,
-                        current_user,
-                        f"thumb_{uploaded_file.filename}",
-                        "image/jpeg"
-                    )
-                except Exception as thumb_error:
-                    media_logger.warning(f"Thumbnail creation failed: {thumb_error}")
+        if len(upload_results) > 1:
+            if isinstance(upload_results[1], BaseException):
+                media_logger.warning(f"Thumbnail creation failed: {upload_results[1]}")
+            else:
+                thumb_name, preview_url = upload_results[1]
 
         # Construct media record
-        record_id = str(uuid.uuid4())
-        current_time = datetime.utcnow().isoformat()
+        record_id = uuid.uuid4().hex
+        current_time = current_timestamp_ms()
         media_record = {
             "id": record_id,
             "mediaType": content_type,
@@ -84,15 +178,18 @@ async def process_file_upload(
             "blobUrl": access_url,
             "tags": parsed_tags,
             "thumbnailUrl": preview_url,
+            "thumbnailFileName": thumb_name,
             "uploadedAt": current_time,
             "updatedAt": current_time
         }
 
         # Persist media metadata
-        persisted_media = cosmos_db.create_media(media_record)
+        persisted_media = await cosmos_db.create_media(media_record)
 
         # Return created resource
-        return ContentRecord(**persisted_media)
+        return build_json_response(
+            build_content_record(persisted_media), status_code=status.HTTP_201_CREATED
+        )
 
     except HTTPException:
         raise
@@ -104,25 +201,44 @@ async def process_file_upload(
         )
 
 
-@router.get("/search", status_code=status.HTTP_200_OK, response_model=ContentCollection)
+@router.get(
+    "/search",
+    status_code=status.HTTP_200_OK,
+    response_class=ORJSONResponse,
+    responses={status.HTTP_200_OK: {"model": ContentCollection}}
+)
 async def find_media_by_query(
     search_term: str = Query(..., min_length=1),
-    page_num: int = Query(1, ge=1),
+    page_num: int = Query(1, ge=1, deprecated=True),
     items_per_page: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None),
+    cosmos_db: CosmosDBClient = Depends(get_cosmos),
     owner_id: str = Depends(get_current_user_id)
 ):
     """Search for media files matching query"""
     try:
-        results, total_count = cosmos_db.search_media(
-            user_id=owner_id, query=search_term, page=page_num, page_size=items_per_page
+        results, total_count, next_cursor = await cosmos_db.search_media(
+            user_id=owner_id,
+            query=search_term,
+            page=page_num,
+            page_size=items_per_page,
+            continuation=cursor
         )
 
-        media_results = [ContentRecord(**item) for item in results]
+        media_results = [build_content_record(item) for item in results]
 
-        return ContentCollection(
-            pageSize=items_per_page, items=media_results, page=page_num, total=total_count
-        )
+        return build_json_response(ContentCollection(
+            pageSize=items_per_page,
+            items=media_results,
+            page=page_num,
+            total=total_count,
+            nextCursor=next_cursor
+        ))
 
+    except InvalidCursorError as cursor_error:
+        raise HTTPException(
+            detail=str(cursor_error), status_code=status.HTTP_400_BAD_REQUEST
+        )
     except Exception as search_error:
         media_logger.error(f"Media search failed: {search_error}")
         raise HTTPException(
@@ -131,25 +247,44 @@ async def find_media_by_query(
         )
 
 
-@router.get("", status_code=status.HTTP_200_OK, response_model=ContentCollection)
+@router.get(
+    "",
+    status_code=status.HTTP_200_OK,
+    response_class=ORJSONResponse,
+    responses={status.HTTP_200_OK: {"model": ContentCollection}}
+)
 async def retrieve_media_list(
-    page_num: int = Query(1, ge=1),
+    page_num: int = Query(1, ge=1, deprecated=True),
     items_per_page: int = Query(20, ge=1, le=100),
-    content_type: Optional[str] = Query(None, regex="^(image|video)$"),
+    content_type: Optional[MediaKind] = Query(None),
+    cursor: Optional[str] = Query(None),
+    cosmos_db: CosmosDBClient = Depends(get_cosmos),
     owner_id: str = Depends(get_current_user_id)
 ):
     """Fetch paginated media collection"""
     try:
-        results, total_count = cosmos_db.get_user_media(
-            user_id=owner_id, page=page_num, page_size=items_per_page, media_type=content_type
+        results, total_count, next_cursor = await cosmos_db.get_user_media(
+            user_id=owner_id,
+            page=page_num,
+            page_size=items_per_page,
+            media_type=content_type.value if content_type else None,
+            continuation=cursor
         )
 
-        collection = [ContentRecord(**item) for item in results]
+        collection = [build_content_record(item) for item in results]
 
-        return ContentCollection(
-            pageSize=items_per_page, total=total_count, page=page_num, items=collection
-        )
+        return build_json_response(ContentCollection(
+            pageSize=items_per_page,
+            total=total_count,
+            page=page_num,
+            items=collection,
+            nextCursor=next_cursor
+        ))
 
+    except InvalidCursorError as cursor_error:
+        raise HTTPException(
+            detail=str(cursor_error), status_code=status.HTTP_400_BAD_REQUEST
+        )
     except Exception as retrieval_error:
         media_logger.error(f"Media list retrieval failed: {retrieval_error}")
         raise HTTPException(
@@ -158,28 +293,28 @@ async def retrieve_media_list(
         )
 
 
-@router.get("/{media_id}", status_code=status.HTTP_200_OK, response_model=ContentRecord)
+@router.get(
+    "/{media_id}",
+    status_code=status.HTTP_200_OK,
+    response_class=ORJSONResponse,
+    responses={status.HTTP_200_OK: {"model": ContentRecord}}
+)
 async def fetch_media_details(
     media_id: str,
+    cosmos_db: CosmosDBClient = Depends(get_cosmos),
     owner_id: str = Depends(get_current_user_id)
 ):
     """Retrieve specific media file details"""
     try:
-        media_item = cosmos_db.get_media_by_id(media_id, owner_id)
+        # The read is scoped to the owner's partition, so other users' media is a 404
+        media_item = await cosmos_db.get_media_by_id(media_id, owner_id)
 
         if not media_item:
             raise HTTPException(
                 detail="Media not found", status_code=status.HTTP_404_NOT_FOUND
             )
 
-        # Check ownership permissions
-        if media_item["userId"] != owner_id:
-            raise HTTPException(
-                detail="You don't have permission to access this media",
-                status_code=status.HTTP_403_FORBIDDEN
-            )
-
-        return ContentRecord(**media_item)
+        return build_json_response(build_content_record(media_item))
 
     except HTTPException:
         raise
@@ -191,31 +326,22 @@ async def fetch_media_details(
         )
 
 
-@router.put("/{media_id}", status_code=status.HTTP_200_OK, response_model=ContentRecord)
+@router.put(
+    "/{media_id}",
+    status_code=status.HTTP_200_OK,
+    response_class=ORJSONResponse,
+    responses={status.HTTP_200_OK: {"model": ContentRecord}}
+)
 async def modify_media_info(
     media_id: str,
     metadata_updates: ContentModification,
+    cosmos_db: CosmosDBClient = Depends(get_cosmos),
     owner_id: str = Depends(get_current_user_id)
 ):
     """Update media file metadata"""
     try:
-        # Retrieve existing media
-        existing_media = cosmos_db.get_media_by_id(media_id, owner_id)
-
-        if not existing_media:
-            raise HTTPException(
-                detail="Media not found", status_code=status.HTTP_404_NOT_FOUND
-            )
-
-        # Validate ownership
-        if existing_media["userId"] != owner_id:
-            raise HTTPException(
-                detail="You don't have permission to update this media",
-                status_code=status.HTTP_403_FORBIDDEN
-            )
-
         # Build update payload
-        update_payload = {"updatedAt": datetime.utcnow().isoformat()}
+        update_payload = {"updatedAt": current_timestamp_ms()}
 
         if metadata_updates.description is not None:
             update_payload["description"] = metadata_updates.description
@@ -223,10 +349,11 @@ async def modify_media_info(
         if metadata_updates.tags is not None:
             update_payload["tags"] = metadata_updates.tags
 
-        # Apply updates to database
-        modified_media = cosmos_db.update_media(media_id, owner_id, update_payload)
+        # Apply updates to database (the owner's partition key scopes the write;
+        # a missing record surfaces as ValueError -> 404)
+        modified_media = await cosmos_db.update_media(media_id, owner_id, update_payload)
 
-        return ContentRecord(**modified_media)
+        return build_json_response(build_content_record(modified_media))
 
     except HTTPException:
         raise
@@ -245,43 +372,27 @@ async def modify_media_info(
 @router.delete("/{media_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def remove_media_file(
     media_id: str,
+    cosmos_db: CosmosDBClient = Depends(get_cosmos),
+    blob_storage: BlobStorageClient = Depends(get_blob_storage),
     owner_id: str = Depends(get_current_user_id)
 ):
     """Delete media file and associated metadata"""
     try:
-        # Fetch media record
-        media_record = cosmos_db.get_media_by_id(media_id, owner_id)
+        # Fetch media record (scoped to the owner's partition)
+        media_record = await cosmos_db.get_media_by_id(media_id, owner_id)
 
         if not media_record:
             raise HTTPException(
                 detail="Media not found", status_code=status.HTTP_404_NOT_FOUND
             )
 
-        # Validate ownership
-        if media_record["userId"] != owner_id:
-            raise HTTPException(
-                detail="You don't have permission to delete this media",
-                status_code=status.HTTP_403_FORBIDDEN
-            )
-
-        # Remove from blob storage
-        blob_storage.delete_file(media_record["fileName"])
-
-        # Remove thumbnail if available
-        if media_record.get("thumbnailUrl"):
-            # Calculate thumbnail blob identifier
-            try:
-                original_filename = media_record["originalFileName"].split("/")[-1]
-                thumb_identifier = media_record["fileName"].replace(
-                    original_filename,
-                    f"thumb_{original_filename}"
-                )
-                blob_storage.delete_file(thumb_identifier)
-            except Exception as thumb_delete_error:
-                media_logger.warning(f"Thumbnail deletion failed: {thumb_delete_error}")
-
-        # Remove from database
-        cosmos_db.delete_media(media_id, owner_id)
+        # Remove blobs and database record concurrently; blob deletion failures are
+        # logged by the storage client, so only a Cosmos failure fails the group
+        async with asyncio.TaskGroup() as deletion_tasks:
+            deletion_tasks.create_task(blob_storage.delete_file(media_record["fileName"]))
+            if thumb_identifier := media_record.get("thumbnailFileName"):
+                deletion_tasks.create_task(blob_storage.delete_file(thumb_identifier))
+            deletion_tasks.create_task(cosmos_db.delete_media(media_id, owner_id))
 
         return None
 
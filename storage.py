@@ -1,31 +1,43 @@
-from azure.storage.blob import BlobServiceClient, generate_blob_sas, BlobSasPermissions, ContentSettings
+from azure.storage.blob import generate_blob_sas, BlobSasPermissions, ContentSettings
+from azure.storage.blob.aio import BlobServiceClient
 from datetime import datetime, timedelta
 from typing import Optional, BinaryIO
 from config import settings
+import asyncio
 import logging
 import os
 import uuid
 
 logger = logging.getLogger(__name__)
 
+# Parallel block uploads per blob
+UPLOAD_MAX_CONCURRENCY = 4
+
+# Cap on simultaneous blob operations per worker
+MAX_CONCURRENT_BLOB_OPERATIONS = 32
+blob_operation_slots = asyncio.Semaphore(MAX_CONCURRENT_BLOB_OPERATIONS)
+
 
 class BlobStorageClient:
     def __init__(self):
-        self.blob_service_client = BlobServiceClient.from_connection_string(
-            settings.azure_storage_connection_string
-        )
+        self.blob_service_client = None
         self.container_name = settings.blob_container_name
         self.container_client = None
 
-    def initialize(self):
+    async def initialize(self):
         """Initialize blob container"""
         try:
+            # One service client (and connection pool) shared by every request
+            self.blob_service_client = BlobServiceClient.from_connection_string(
+                settings.azure_storage_connection_string
+            )
+
             # Create container if it doesn't exist
             self.container_client = (
                 self.blob_service_client.get_container_client(self.container_name)
             )
-            if not self.container_client.exists():
-                self.container_client.create_container()
+            if not await self.container_client.exists():
+                await self.container_client.create_container()
                 logger.info(f"Container '{self.container_name}' created")
             else:
                 logger.info(f"Container '{self.container_name}' already exists")
@@ -33,8 +45,18 @@ class BlobStorageClient:
             logger.error(f"Failed to initialize blob storage: {e}")
             raise
 
-    def upload_file(
-        self, file: BinaryIO, user_id: str, original_filename: str, content_type: str
+    async def close(self):
+        """Release the service client's connection pool"""
+        if self.blob_service_client is not None:
+            await self.blob_service_client.close()
+
+    async def upload_file(
+        self,
+        file: BinaryIO,
+        user_id: str,
+        original_filename: str,
+        content_type: str,
+        length: Optional[int] = None
     ) -> tuple[str, str]:
         """
         Upload file to blob storage
@@ -44,7 +66,7 @@ class BlobStorageClient:
             # Generate unique filename
             file_extension = os.path.splitext(original_filename)[1]
             timestamp = datetime.utcnow().strftime("%Y%m%d%H%M%S")
-            unique_id = str(uuid.uuid4())[:8]
+            unique_id = uuid.uuid4().hex[:8]
             blob_name = f"{user_id}/{timestamp}_{unique_id}{file_extension}"
 
             # Upload to blob storage
@@ -52,11 +74,15 @@ class BlobStorageClient:
                 container=self.container_name, blob=blob_name
             )
 
-            blob_client.upload_blob(
-                file,
-                content_settings=ContentSettings(content_type=content_type),
-                overwrite=True,
-            )
+            # Known length lets the SDK stage blocks in parallel straight from the stream
+            async with blob_operation_slots:
+                await blob_client.upload_blob(
+                    file,
+                    length=length,
+                    max_concurrency=UPLOAD_MAX_CONCURRENCY,
+                    content_settings=ContentSettings(content_type=content_type),
+                    overwrite=True,
+                )
 
             # Generate URL with SAS token
             blob_url = self._generate_blob_url_with_sas(blob_name)
@@ -68,13 +94,14 @@ class BlobStorageClient:
             logger.error(f"Failed to upload file: {e}")
             raise
 
-    def delete_file(self, blob_name: str) -> bool:
+    async def delete_file(self, blob_name: str) -> bool:
         """Delete file from blob storage"""
         try:
             blob_client = self.blob_service_client.get_blob_client(
                 container=self.container_name, blob=blob_name
             )
-            blob_client.delete_blob()
+            async with blob_operation_slots:
+                await blob_client.delete_blob()
             logger.info(f"File deleted successfully: {blob_name}")
             return True
         except Exception as e:
@@ -121,3 +148,8 @@ class BlobStorageClient:
 
 # Global instance
 blob_storage = BlobStorageClient()
+
+
+async def get_blob_storage() -> BlobStorageClient:
+    """Dependency providing the process-wide blob storage client"""
+    return blob_storage
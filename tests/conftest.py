@@ -0,0 +1,12 @@
+import os
+import sys
+from pathlib import Path
+
+# Settings are read at import time; tests never reach Azure, so placeholders suffice
+os.environ.setdefault("COSMOS_ENDPOINT", "https://localhost:8081/")
+os.environ.setdefault("COSMOS_KEY", "test-key")
+os.environ.setdefault("AZURE_STORAGE_CONNECTION_STRING", "UseDevelopmentStorage=true")
+os.environ.setdefault("JWT_SECRET_KEY", "test-secret")
+
+# The application modules live at the repository root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
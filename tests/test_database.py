@@ -0,0 +1,125 @@
+import asyncio
+import time
+
+import pytest
+from azure.core.exceptions import ServiceRequestError
+from azure.cosmos import exceptions
+
+from config import settings
+from database import CosmosDBClient, STALE_EMAIL_CLAIM_SECONDS, _email_index_id
+
+
+class FakeContainer:
+    """In-memory stand-in for the async Cosmos container calls create_user makes"""
+
+    def __init__(self):
+        self.items = {}
+        self.fail_next_create = None
+
+    async def create_item(self, body):
+        if self.fail_next_create is not None:
+            failure, self.fail_next_create = self.fail_next_create, None
+            raise failure
+        if body["id"] in self.items:
+            raise exceptions.CosmosResourceExistsError(status_code=409, message="Conflict")
+        self.items[body["id"]] = {**body, "_ts": int(time.time()), "_etag": "1"}
+        return self.items[body["id"]]
+
+    async def read_item(self, item, partition_key):
+        if item not in self.items:
+            raise exceptions.CosmosResourceNotFoundError(status_code=404, message="Not found")
+        return self.items[item]
+
+    async def replace_item(self, item, body, etag=None, match_condition=None):
+        if etag is not None and self.items[item]["_etag"] != etag:
+            raise exceptions.CosmosAccessConditionFailedError(status_code=412, message="Changed")
+        self.items[item] = {**body, "_ts": int(time.time()), "_etag": str(int(etag or 0) + 1)}
+        return self.items[item]
+
+    async def upsert_item(self, body):
+        self.items[body["id"]] = {**body, "_ts": int(time.time()), "_etag": "1"}
+        return self.items[body["id"]]
+
+    async def delete_item(self, item, partition_key):
+        self.items.pop(item, None)
+
+    async def query_items(self, query, parameters, max_item_count=None):
+        email = parameters[0]["value"]
+        for account in list(self.items.values()):
+            if account.get("email") == email:
+                yield account
+
+
+def make_client():
+    client = CosmosDBClient()
+    client.users_container = FakeContainer()
+    client.users_by_email_container = FakeContainer()
+    return client
+
+
+def make_account(account_id, email="b@x.io"):
+    return {"id": account_id, "email": email, "username": "bob", "hashed_password": "x"}
+
+
+def test_failed_user_write_releases_email_claim():
+    client = make_client()
+    client.users_container.fail_next_create = ServiceRequestError("connection reset")
+
+    with pytest.raises(ServiceRequestError):
+        asyncio.run(client.create_user(make_account("first")))
+    assert _email_index_id("b@x.io") not in client.users_by_email_container.items
+
+    saved_account = asyncio.run(client.create_user(make_account("second")))
+    assert saved_account["id"] == "second"
+    assert asyncio.run(client.get_user_by_email("b@x.io"))["id"] == "second"
+
+
+def test_stale_email_claim_is_replaced():
+    client = make_client()
+    claim_id = _email_index_id("b@x.io")
+    client.users_by_email_container.items[claim_id] = {
+        "id": claim_id,
+        "email": "b@x.io",
+        "userId": "never-written",
+        "_ts": int(time.time()) - STALE_EMAIL_CLAIM_SECONDS - 1,
+        "_etag": "1"
+    }
+
+    asyncio.run(client.create_user(make_account("second")))
+    assert client.users_by_email_container.items[claim_id]["userId"] == "second"
+
+
+def test_live_email_claim_rejects_duplicate():
+    client = make_client()
+    asyncio.run(client.create_user(make_account("first")))
+
+    with pytest.raises(ValueError):
+        asyncio.run(client.create_user(make_account("second")))
+    assert "second" not in client.users_container.items
+
+
+def test_legacy_email_lookup_can_be_disabled(monkeypatch):
+    client = make_client()
+    client.users_container.items["legacy"] = make_account("legacy")
+    monkeypatch.setattr(settings, "legacy_email_lookup", False)
+
+    assert asyncio.run(client.get_user_by_email("b@x.io")) is None
+    assert _email_index_id("b@x.io") not in client.users_by_email_container.items
+
+
+def test_legacy_account_is_indexed_on_login():
+    client = make_client()
+    client.users_container.items["legacy"] = make_account("legacy")
+
+    assert asyncio.run(client.get_user_by_email("b@x.io"))["id"] == "legacy"
+    assert client.users_by_email_container.items[_email_index_id("b@x.io")]["userId"] == "legacy"
+
+
+def test_registration_rejects_unindexed_legacy_email():
+    client = make_client()
+    client.users_container.items["legacy"] = make_account("legacy")
+
+    with pytest.raises(ValueError):
+        asyncio.run(client.create_user(make_account("second")))
+    assert client.users_by_email_container.items[_email_index_id("b@x.io")]["userId"] == "legacy"
+    assert "second" not in client.users_container.items
@@ -1,12 +1,20 @@
 from fastapi import UploadFile, HTTPException, status
 from PIL import Image
+from datetime import datetime, timezone
 import io
-from typing import Optional
+import time
+from typing import Optional, Union
 from config import settings
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Allowed MIME types resolved once at import; settings only hold comma-separated strings
+MEDIA_KIND_BY_MIME_TYPE = {
+    **{mime.lower(): "video" for mime in settings.allowed_video_types_list},
+    **{mime.lower(): "image" for mime in settings.allowed_image_types_list}
+}
+
 
 def validate_file_type(file: UploadFile) -> str:
     """
@@ -14,16 +22,15 @@ def validate_file_type(file: UploadFile) -> str:
     """
     content_type = file.content_type.lower()
 
-    if content_type in settings.allowed_image_types_list:
-        return "image"
-    elif content_type in settings.allowed_video_types_list:
-        return "video"
-    else:
+    media_kind = MEDIA_KIND_BY_MIME_TYPE.get(content_type)
+    if media_kind is None:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"File type '{content_type}' is not allowed. Allowed types: {settings.allowed_image_types}, {settings.allowed_video_types}",
         )
 
+    return media_kind
+
 
 def validate_file_size(file: UploadFile, max_size: int = None) -> int:
     """
@@ -32,10 +39,12 @@ def validate_file_size(file: UploadFile, max_size: int = None) -> int:
     if max_size is None:
         max_size = settings.max_file_size_bytes
 
-    # Read file to get size
-    file.file.seek(0, 2)  # Seek to end
-    file_size = file.file.tell()
-    file.file.seek(0)  # Seek back to beginning
+    # The multipart parser records the size while spooling; only measure when it didn't
+    file_size = file.size
+    if file_size is None:
+        file.file.seek(0, 2)  # Seek to end
+        file_size = file.file.tell()
+        file.file.seek(0)  # Seek back to beginning
 
     if file_size > max_size:
         raise HTTPException(
@@ -48,23 +57,25 @@ def validate_file_size(file: UploadFile, max_size: int = None) -> int:
 
 def generate_thumbnail(image_data: bytes, max_size: tuple = (300, 300)) -> Optional[bytes]:
     """
-    Generate thumbnail from image data
+    Generate thumbnail from image bytes
     Returns thumbnail as bytes or None if failed
     """
     try:
         # Open image
         image = Image.open(io.BytesIO(image_data))
 
-        # Convert RGBA to RGB if necessary
-        if image.mode in ("RGBA", "LA", "P"):
-            background = Image.new("RGB", image.size, (255, 255, 255))
-            if image.mode == "P":
-                image = image.convert("RGBA")
-            background.paste(image, mask=image.split()[-1] if image.mode == "RGBA" else None)
-            image = background
+        # Palette images can only resize with NEAREST, so expand them first
+        if image.mode == "P":
+            image = image.convert("RGBA")
 
         # Generate thumbnail
-        image.thumbnail(max_size, Image.Resampling.LANCZOS)
+        image.thumbnail(max_size, Image.Resampling.BILINEAR)
+
+        # Flatten transparency onto white (done after resizing, on the small image)
+        if image.mode in ("RGBA", "LA"):
+            background = Image.new("RGB", image.size, (255, 255, 255))
+            background.paste(image, mask=image.split()[-1])
+            image = background
 
         # Save to bytes
         output = io.BytesIO()
@@ -78,6 +89,28 @@ def generate_thumbnail(image_data: bytes, max_size: tuple = (300, 300)) -> Optio
         return None
 
 
+def current_timestamp_ms() -> int:
+    """Current UTC time as epoch milliseconds (stored form of all timestamps)"""
+    return time.time_ns() // 1_000_000
+
+
+def to_timestamp_ms(value: Union[int, str]) -> int:
+    """Convert a stored ISO-8601 timestamp to epoch milliseconds"""
+    if isinstance(value, int):
+        return value
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return int(parsed.timestamp() * 1000)
+
+
+def from_timestamp_ms(value: Union[int, str]) -> datetime:
+    """Convert a stored timestamp (epoch milliseconds or legacy ISO-8601) to a datetime"""
+    if isinstance(value, str):
+        return datetime.fromisoformat(value)
+    return datetime.fromtimestamp(value / 1000, tz=timezone.utc)
+
+
 def format_file_size(size_bytes: int) -> str:
     """Format file size in human-readable format"""
     for unit in ["B", "KB", "MB", "GB"]: